@@ -1,144 +1,185 @@
 import pandas as pd
-import os
+import numpy as np
+import functools
+import openpyxl
 import logging
-from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
-from sqlalchemy.dialects.postgresql import JSONB
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+from etl_common import setup_logging, get_staging_engine
+from loader_common import (
+    copy_in_parallel,
+    extract_staging_data,
+    prepare_destination,
+    publish_stage,
+    read_mapping_sheet,
+    select_mapped_columns,
+    to_arrow_strings,
+    to_datetime_column
+)
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
-from sqlalchemy import create_engine, text
-from sqlalchemy.dialects.postgresql import UUID
-
-# Load environment variables
-load_dotenv()
-
-# Define PostgreSQL Connection String (Source and Destination)
-POSTGRES_CONN_STR = (
-    f"postgresql+psycopg://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}"
-    f"@{os.getenv('POSTGRES_HOST', 'localhost')}:{os.getenv('POSTGRES_PORT', '5432')}/{os.getenv('POSTGRES_DB')}"
-)
-
+from pandas.api.types import is_datetime64_any_dtype, is_integer_dtype, is_string_dtype
 
-POSTGRES_DEST_CONN_STR = (
-    f"postgresql+psycopg://{os.getenv('POSTGRES_USER_DEST')}:{os.getenv('POSTGRES_PASSWORD_DEST')}"
-    f"@{os.getenv('POSTGRES_HOST_DEST', 'localhost')}:{os.getenv('POSTGRES_PORT_DEST', '5432')}/{os.getenv('POSTGRES_DB_DEST')}"
-)
-
-# Create SQLAlchemy Engine
-source_engine = create_engine(POSTGRES_CONN_STR)
-destination_engine = create_engine(POSTGRES_DEST_CONN_STR)
-
-# Configure logging
-log_dir = os.path.join(os.getcwd(), "log")
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
-
-log_file = os.path.join(log_dir, "data_migration.log")
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(log_file, mode="a", encoding="utf-8"),
-        logging.StreamHandler()
-    ]
-)
+# Shared SQLAlchemy engine and logging
+setup_logging()
+source_engine = get_staging_engine()
 
 # Create a session for transactions
 Session = sessionmaker(bind=source_engine)
 session = Session()
 
 
-# Extract data from staging DB
-def extract_staging_data():
-    """Fetch data from staging DB."""
-    tables = ["stg_customers", "customer_uuids"]
-    dataframes = {}
-
-    with source_engine.connect() as conn:
-        for table in tables:
-            query = f"SELECT * FROM {table};"
-            df = pd.read_sql(query, conn)
-            dataframes[table] = df
-    
-    return dataframes
-
-df_extracted = extract_staging_data()
-stg_customers = df_extracted["stg_customers"]
-customer_uuids = df_extracted["customer_uuids"]
-
-
 # Load mapping document
+@functools.lru_cache(maxsize=1)
 def load_mapping():
     """Load mapping document and return relevant dictionaries."""
 
     # Mapping Document Path
     mapping_file = "mapping_doc/migration_mapping_doc.xlsx"
 
-    # Load Individual and Corporate mappings
-    df_ind_mapping = pd.read_excel(mapping_file, sheet_name="Customer Profile Individual")
-    df_corp_mapping = pd.read_excel(mapping_file, sheet_name="Customer Profile Corporate")
+    # Open the workbook once and read all four sheets from it
+    wb = openpyxl.load_workbook(mapping_file, read_only=True, data_only=True)
+    try:
+        # Load Individual and Corporate mappings
+        ind_mapping = read_mapping_sheet(wb, "Customer Profile Individual")
+        corp_mapping = read_mapping_sheet(wb, "Customer Profile Corporate")
 
-    # Load JSON Field sheets
-    df_json_ind = pd.read_excel(mapping_file, sheet_name="JSON Field Individual")
-    df_json_corp = pd.read_excel(mapping_file, sheet_name="JSON Field Corporate")
+        # Load JSON Field sheets
+        json_ind = read_mapping_sheet(wb, "JSON Field Individual")
+        json_corp = read_mapping_sheet(wb, "JSON Field Corporate")
+    finally:
+        wb.close()
 
     # Convert mappings to dictionaries
-    ind_map = {k:v for k, v in zip(df_ind_mapping["Source Field"], df_ind_mapping["Destination Field"]) if pd.notna(k)}
-    corp_map = {k:v for k, v in zip(df_corp_mapping["Source Field"], df_corp_mapping["Destination Field"]) if pd.notna(k)}
+    ind_map = {k:v for k, v in zip(ind_mapping["Source Field"], ind_mapping["Destination Field"]) if k is not None}
+    corp_map = {k:v for k, v in zip(corp_mapping["Source Field"], corp_mapping["Destination Field"]) if k is not None}
 
     # Default Values
-    ind_defaults = {k: v for k, v in zip(df_ind_mapping["Destination Field"], df_ind_mapping["Default Value"]) if pd.notna(k)}
-    corp_defaults = {k: v for k, v in zip(df_corp_mapping["Destination Field"], df_corp_mapping["Default Value"]) if pd.notna(k)}
+    ind_defaults = {k: v for k, v in zip(ind_mapping["Destination Field"], ind_mapping["Default Value"]) if k is not None}
+    corp_defaults = {k: v for k, v in zip(corp_mapping["Destination Field"], corp_mapping["Default Value"]) if k is not None}
 
     # Extract JSON Fields in the **exact order** from the document
-    json_ind_fields = df_json_ind["Destination Field"].dropna().tolist()  #  Preserves ordinal order in Excel Mapping Document
-    json_corp_fields = df_json_corp["Destination Field"].dropna().tolist()  #  Preserves ordinal order in Excel Mapping Document
+    json_ind_fields = [f for f in json_ind["Destination Field"] if f is not None]  #  Preserves ordinal order in Excel Mapping Document
+    json_corp_fields = [f for f in json_corp["Destination Field"] if f is not None]  #  Preserves ordinal order in Excel Mapping Document
 
     return ind_map, corp_map, ind_defaults, corp_defaults, json_ind_fields, json_corp_fields
 
-# Load mapping document
-ind_map, corp_map, ind_defaults, corp_defaults, json_ind_fields, json_corp_fields = load_mapping()
+
+# Python types that can be written to JSON as they are
+_JSON_SAFE_TYPES = (str, int, float, bool, list, dict)
+
+
+def format_dates(col):
+    """Format a datetime column as YYYY-MM-DD strings, with "" for NaT.
+
+    Uses numpy's compiled datetime formatter on the int64 day values rather than
+    calling `strftime` on every Timestamp.
+    """
+    if col.dt.tz is not None:
+        col = col.dt.tz_localize(None)  # Keep the local wall-clock date
+
+    days = col.to_numpy(dtype="datetime64[D]")
+    formatted = np.datetime_as_string(days, unit="D").astype(object)
+    formatted[np.isnat(days)] = ""
+
+    return formatted
 
 
-def build_json(row, json_fields, defaults):
-    """Constructs the JSON structure for `customerProfileData`, ensuring:
+def build_json_column(df, json_fields, defaults):
+    """Constructs the serialized JSON for `customerProfileData` column by column, ensuring:
 
     - Date fields are converted to string format (YYYY-MM-DD).
     - Missing values (NaT, None) are replaced with an empty string "".
     """
-    structured_json = {} # Use a dictionary to maintain order
+    arrays = []
 
     for field in json_fields:  # Maintain order from Excel
-        value = row.get(field, defaults.get(field, ""))
+        if field in df:
+            col = df[field]
+        else:
+            col = pd.Series([defaults.get(field, "")] * len(df), index=df.index)
 
         # Convert date, and Timestamp to string format
-        if isinstance(value, (pd.Timestamp)):
-            value = value.strftime('%Y-%m-%d')  # Correct datetime handling
+        if is_datetime64_any_dtype(col):
+            arrays.append(format_dates(col))
+            continue
+
+        # Ensure JSON contains only serializable data; numeric, boolean and string dtypes
+        # always are, so only generic object columns need the per-value check
+        if col.dtype.kind not in "iufb" and not isinstance(col.dtype, pd.StringDtype):
+            col = col.map(lambda v: v if isinstance(v, _JSON_SAFE_TYPES) else str(v), na_action="ignore")
 
         # Handle missing values properly
-        if pd.isna(value):
-            value = ""
+        values = col.to_numpy(dtype=object, copy=True)
+        values[col.isna().to_numpy()] = ""
 
-        # Ensure JSON contains only serializable data
-        if not isinstance(value, (str, int, float, bool, list, dict, type(None))):
-            value = str(value)
+        arrays.append(values)
 
-        structured_json[field] = value  # Assign value to JSON field
+    # Serialize once with orjson; PostgreSQL parses the text into the jsonb column during COPY.
+    # The documents are kept in an Arrow string array rather than as one Python object per row
+    return pd.array(
+        [orjson.dumps(dict(zip(json_fields, values))).decode() for values in zip(*arrays)],
+        dtype="string[pyarrow]"
+    )
 
-    return structured_json
 
+def concat_frames(df_ind, df_corp):
+    """Stack the Individual and Corporate DataFrames through Arrow tables.
+
+    Arrow releases each buffer while converting back to pandas (`self_destruct`), which
+    keeps the concat from holding both inputs and the result in pandas blocks at once.
+    Falls back to `pd.concat` when a column cannot be unified to one Arrow type
+    (e.g. numeric in one frame and a "" default in the other).
+    """
+    try:
+        table = pa.concat_tables(
+            [pa.Table.from_pandas(df, preserve_index=False) for df in (df_ind, df_corp)],
+            promote_options="default"
+        )
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pd.concat([df_ind, df_corp], ignore_index=True)
+
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def to_string_column(col):
+    """Cast an integer or string column to text with Arrow's cast kernel.
+
+    Missing values stay missing (NULL in PostgreSQL) instead of becoming "nan"/"None".
+    Other dtypes (e.g. floats, which Arrow would format in scientific notation) keep `astype(str)`.
+    """
+    if not (is_integer_dtype(col) or is_string_dtype(col)):
+        return col.astype(str)
+
+    try:
+        arr = pc.cast(pa.array(col, from_pandas=True), pa.string())
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return col.astype(str)
+
+    return pd.Series(arr.to_numpy(zero_copy_only=False), index=col.index, name=col.name)
 
-import pandas as pd
 
 # Transform Data
 def transform_data(stg_customers_df, customer_uuids_df):
     """Join extracted data with pre-generated UUID mapping and apply transformations."""
 
-    df = pd.merge(stg_customers_df, customer_uuids_df, on='customer_code', how='left')
+    # Load mapping document (cached after the first call)
+    ind_map, corp_map, ind_defaults, corp_defaults, json_ind_fields, json_corp_fields = load_mapping()
+
+    # Attach the pre-generated UUIDs with a hash lookup on customer_code (left join semantics)
+    uuid_cols = customer_uuids_df.set_index('customer_code')
+    df = stg_customers_df.assign(**{
+        col: stg_customers_df['customer_code'].map(uuid_cols[col]) for col in uuid_cols.columns
+    })
 
-    # Split DataFrame into Individual & Corporate
-    df_ind = df[df["customer_type"] == "Individual"].copy()
-    df_corp = df[df["customer_type"] == "SME"].copy()
+    # Store text columns in contiguous Arrow buffers instead of one Python object per cell
+    df = to_arrow_strings(df)
+
+    # Split DataFrame into Individual & Corporate with positional takes (missing types match neither)
+    customer_type = df["customer_type"]
+    df_ind = df.take(np.flatnonzero(customer_type.eq("Individual").to_numpy(dtype=bool, na_value=False)))
+    df_corp = df.take(np.flatnonzero(customer_type.eq("SME").to_numpy(dtype=bool, na_value=False)))
 
     # Apply Field Mappings
     df_ind.rename(columns=ind_map, inplace=True)
@@ -148,39 +189,30 @@ def transform_data(stg_customers_df, customer_uuids_df):
     all_ind_columns = set(ind_map.values()).union(set(ind_defaults.keys()))
     all_corp_columns = set(corp_map.values()).union(set(corp_defaults.keys()))
 
-    # Ensure all required columns exist in the DataFrame for individual and corporate
-    for column in all_ind_columns:
-        if column not in df_ind.columns:
-            df_ind[column] = ind_defaults.get(column, "")
-
-    for column in all_corp_columns:
-        if column not in df_corp.columns:
-            df_corp[column] = corp_defaults.get(column, "")
-
-    # Filter columns based on "Destination Field" in the mapping document
-    df_ind = df_ind[list(all_ind_columns)]
-    df_corp = df_corp[list(all_corp_columns)]
-  
+    # Ensure all required columns exist in the DataFrame for individual and corporate,
+    # keeping only the "Destination Field" columns from the mapping document
+    df_ind = select_mapped_columns(df_ind, all_ind_columns, ind_defaults)
+    df_corp = select_mapped_columns(df_corp, all_corp_columns, corp_defaults)
 
     # Apply JSON transformation to both dataframes (Individual & Corporate)
-    df_ind["customerProfileData"] = df_ind.apply(lambda x: build_json(x, json_ind_fields, ind_defaults), axis=1)
-    df_corp["customerProfileData"] = df_corp.apply(lambda x: build_json(x, json_corp_fields, corp_defaults), axis=1)
+    df_ind["customerProfileData"] = build_json_column(df_ind, json_ind_fields, ind_defaults)
+    df_corp["customerProfileData"] = build_json_column(df_corp, json_corp_fields, corp_defaults)
 
     # Consolidate Individual & Corporate DataFrames into a single DataFrame
-    df_final = pd.concat([df_ind, df_corp], ignore_index=True)
+    df_final = concat_frames(df_ind, df_corp)
 
     # Convert datetime fields to pandas datetime
     datetime_columns = ['createdAt', 'updatedAt']
     for col in datetime_columns:
         if col in df_final.columns:
-            df_final[col] = pd.to_datetime(df_final[col], errors='coerce')  # Convert to datetime
+            df_final[col] = to_datetime_column(df_final[col])  # Convert to datetime
 
 
     # Convert integer fields to string where required (PostgreSQL expects text for certain columns)
     int_to_str_columns = ["customerNumber", "bvn"]
     for col in int_to_str_columns:
         if col in df_final.columns:
-            df_final[col] = df_final[col].astype(str)
+            df_final[col] = to_string_column(df_final[col])
 
     # Drop index to prevent misalignment
     df_final.reset_index(drop=True, inplace=True)
@@ -194,47 +226,22 @@ def load_data(df_final):
     try:
         logging.info("📥 Loading data into Destination...")
         
-        # Fetch valid columns from the destination table
-        with destination_engine.connect() as conn:
-            query = text("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'customer_profile'
-            """)
-            columns = conn.execute(query).fetchall()
-            valid_columns = [col[0] for col in columns]  # List of valid columns in destination table
-
-            # Ensure only valid columns are inserted
-            df_final = df_final[[col for col in df_final.columns if col in valid_columns]]
-
-            # Ensure missing columns in the DataFrame are filled with default values
-            for col in valid_columns:
-                if col not in df_final.columns:
-                    df_final[col] = None  # Default value (can be set to a specific value like "Unknown")
-
-            # Define PostgreSQL column type mappings (to handle UUID and JSONB)
-            dtype_map = {
-                "customerId": UUID,
-                "customerProfileId": UUID,
-                "customerProfileData": JSONB
-            }
-
-            # Delete Existing Records Before Inserting new ones in order not to violate unique constraints
-            with destination_engine.begin() as conn:
-                conn.execute(
-                    text("""TRUNCATE TABLE customer_profile;""")
-                )
-            
-            # Bulk Insert Data using pandas to_sql method
-            df_final.to_sql(
-                "customer_profile",
-                destination_engine,
-                if_exists="append",
-                index=False,
-                dtype=dtype_map,  # Apply proper type mapping
-                method="multi",   # Faster bulk insert
-                chunksize=1000
-            )
+        # Fetch valid columns from the destination table and recreate its stage table
+        valid_columns = prepare_destination("customer_profile")
+
+        # Ensure only valid columns are inserted
+        df_final = df_final[[col for col in df_final.columns if col in valid_columns]]
+
+        # Ensure missing columns in the DataFrame are filled with default values
+        for col in valid_columns:
+            if col not in df_final.columns:
+                df_final[col] = None  # Default value (can be set to a specific value like "Unknown")
+
+        # Bulk Insert Data into the stage table using parallel COPY FROM STDIN streams (UUID columns are parsed by PostgreSQL)
+        copy_in_parallel("customer_profile_stage", df_final)
+
+        # Swap the staged rows into the destination table in one transaction
+        publish_stage("customer_profile", valid_columns)
 
         logging.info("✅ Data successfully inserted into customer_profile.")
 
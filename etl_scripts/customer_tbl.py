@@ -1,44 +1,23 @@
-import pandas as pd
-from sqlalchemy import create_engine, text
-from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import sessionmaker
-import os
+import functools
+import openpyxl
 import logging
 from datetime import datetime
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Define PostgreSQL Connection String (Source and Destination)
-POSTGRES_CONN_STR = (
-    f"postgresql+psycopg://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}"
-    f"@{os.getenv('POSTGRES_HOST', 'localhost')}:{os.getenv('POSTGRES_PORT', '5432')}/{os.getenv('POSTGRES_DB')}"
-)
-
-POSTGRES_DEST_CONN_STR = (
-    f"postgresql+psycopg://{os.getenv('POSTGRES_USER_DEST')}:{os.getenv('POSTGRES_PASSWORD_DEST')}"
-    f"@{os.getenv('POSTGRES_HOST_DEST', 'localhost')}:{os.getenv('POSTGRES_PORT_DEST', '5432')}/{os.getenv('POSTGRES_DB_DEST')}"
+from etl_common import setup_logging, get_staging_engine
+from loader_common import (
+    copy_in_parallel,
+    extract_staging_data,
+    prepare_destination,
+    publish_stage,
+    read_mapping_sheet,
+    select_mapped_columns,
+    to_arrow_strings,
+    to_datetime_column
 )
 
-# Create SQLAlchemy Engine
-source_engine = create_engine(POSTGRES_CONN_STR)
-destination_engine = create_engine(POSTGRES_DEST_CONN_STR)
-
-# Configure logging
-log_dir = os.path.join(os.getcwd(), "log")
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
-
-log_file = os.path.join(log_dir, "data_migration.log")
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(log_file, mode="a", encoding="utf-8"),
-        logging.StreamHandler()
-    ]
-)
+# Shared SQLAlchemy engine and logging
+setup_logging()
+source_engine = get_staging_engine()
 
 # ✅ Create a session for transactions
 Session = sessionmaker(bind=source_engine)
@@ -46,42 +25,36 @@ session = Session()
 
 
 # Load Field Mapping
+@functools.lru_cache(maxsize=1)
 def load_mapping():
     """Load field mappings from the migration_mapping_document."""
     mapping_file = "mapping_doc/migration_mapping_doc.xlsx"
-    df_mapping = pd.read_excel(mapping_file, sheet_name="Customer Ind-Corporate")
+
+    wb = openpyxl.load_workbook(mapping_file, read_only=True, data_only=True)
+    try:
+        mapping = read_mapping_sheet(wb, "Customer Ind-Corporate")
+    finally:
+        wb.close()
 
     # Extract mappings: Source → Destination, Default Values
-    field_map = {k: v for k, v in zip(df_mapping["Source Field"], df_mapping["Destination Field"]) if pd.notna(k)}
-    default_values = {k: v for k, v in zip(df_mapping["Destination Field"], df_mapping["Default Value"]) if pd.notna(k)}
+    field_map = {k: v for k, v in zip(mapping["Source Field"], mapping["Destination Field"]) if k is not None}
+    default_values = {k: v for k, v in zip(mapping["Destination Field"], mapping["Default Value"]) if k is not None}
 
     return field_map, default_values
 
 
-# Extract data from staging DB
-def extract_staging_data():
-    """Fetch data from staging DB."""
-    tables = ["stg_customers", "customer_uuids"]
-    dataframes = {}
-
-    with source_engine.connect() as conn:
-        for table in tables:
-            query = f"SELECT * FROM {table};"
-            df = pd.read_sql(query, conn)
-            dataframes[table] = df
-    
-    return dataframes
-
-df_extracted = extract_staging_data()
-stg_customers = df_extracted["stg_customers"]
-customer_uuids = df_extracted["customer_uuids"]
-
-
 # Transform Data
 def transform_data(stg_customers_df, customer_uuids_df):
     """Join extracted data with pre-generated UUID mapping and apply transformations."""
 
-    df_all = pd.merge(stg_customers_df, customer_uuids_df, on='customer_code', how='left')
+    # Attach the pre-generated UUIDs with a hash lookup on customer_code (left join semantics)
+    uuid_cols = customer_uuids_df.set_index('customer_code')
+    df_all = stg_customers_df.assign(**{
+        col: stg_customers_df['customer_code'].map(uuid_cols[col]) for col in uuid_cols.columns
+    })
+
+    # Store text columns in contiguous Arrow buffers instead of one Python object per cell
+    df_all = to_arrow_strings(df_all)
 
     # Load Field Mapping
     field_map, default_values = load_mapping()
@@ -93,33 +66,23 @@ def transform_data(stg_customers_df, customer_uuids_df):
     all_ind_columns = set(field_map.values()).union(set(default_values.keys()))
 
 
-    # Ensure all required columns exist in the DataFrame for individual and corporate
-    for column in all_ind_columns:
-        if column not in df_all.columns:
-            df_all[column] = default_values.get(column, "")
-
-
-    # Filter columns based on "Destination Field" in the mapping document
-    df_all = df_all[list(all_ind_columns)]
+    # Ensure all required columns exist in the DataFrame,
+    # keeping only the "Destination Field" columns from the mapping document
+    df_all = select_mapped_columns(df_all, all_ind_columns, default_values)
 
 
     # Convert datetime fields to pandas datetime
     datetime_columns = ['createdAt', 'updatedAt']
     for col in datetime_columns:
         if col in df_all.columns:
-            df_all[col] = pd.to_datetime(df_all[col], errors='coerce')  # Convert to datetime
+            df_all[col] = to_datetime_column(df_all[col])  # Convert to datetime
 
 
     # Drop index to prevent misalignment
     df_all.reset_index(drop=True, inplace=True)
 
-    print(df_all.columns)
-
     return df_all
 
-df = transform_data(stg_customers, customer_uuids)
-
-
 
 # Load Data into PostgreSQL
 def load_data(df):
@@ -128,50 +91,22 @@ def load_data(df):
     try:
         logging.info("📥 Loading data into Destination...")
         
-        # Fetch valid columns from the destination table
-        with destination_engine.connect() as conn:
-            query = text("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'customer'
-            """)
-            columns = conn.execute(query).fetchall()
-            valid_columns = [col[0] for col in columns]  # List of valid columns in destination table
-
-            # Ensure only valid columns are inserted
-            df = df[[col for col in df.columns if col in valid_columns]]
-
-            # Ensure missing columns in the DataFrame are filled with default values (e.g. None or specific defaults)
-            for col in valid_columns:
-                if col not in df.columns:
-                    df[col] = None  # Default value, can be a specific value like "Unknown"
-
-
-            # Delete Existing Records Before Insert
-            with destination_engine.begin() as conn:
-                conn.execute(
-                    text("""TRUNCATE TABLE customer;""")
-                )
-
-            # Define PostgreSQL column type mappings (to handle UUID)
-            dtype_map = {
-                "customerId": UUID,
-                "tenantId": UUID,
-                "approverId": UUID,
-                "initiatorId": UUID,
-                "branchId": UUID
-            }
-
-            # Bulk Insert Data using pandas to_sql method
-            df.to_sql(
-                "customer",
-                destination_engine,
-                if_exists="append",
-                index=False,
-                dtype=dtype_map,  # Apply proper type mapping
-                method="multi",   # Faster bulk insert
-                chunksize=1000
-            )
+        # Fetch valid columns from the destination table and recreate its stage table
+        valid_columns = prepare_destination("customer")
+
+        # Ensure only valid columns are inserted
+        df = df[[col for col in df.columns if col in valid_columns]]
+
+        # Ensure missing columns in the DataFrame are filled with default values (e.g. None or specific defaults)
+        for col in valid_columns:
+            if col not in df.columns:
+                df[col] = None  # Default value, can be a specific value like "Unknown"
+
+        # Bulk Insert Data into the stage table using parallel COPY FROM STDIN streams (UUID columns are parsed by PostgreSQL)
+        copy_in_parallel("customer_stage", df)
+
+        # Swap the staged rows into the destination table in one transaction
+        publish_stage("customer", valid_columns)
 
         logging.info("✅ Data successfully inserted into customer.")
 
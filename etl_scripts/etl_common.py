@@ -0,0 +1,73 @@
+import os
+import logging
+from functools import lru_cache
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+
+# Load environment variables
+load_dotenv()
+
+# Define Source Database Connection String (SQL Server)
+SQL_SERVER_CONN_STR = (
+    f"mssql+pyodbc://{os.getenv('SQL_SERVER_USER')}:{os.getenv('SQL_SERVER_PASSWORD')}"
+    f"@{os.getenv('SQL_SERVER_HOST')}/{os.getenv('SQL_SERVER_DB')}?driver=ODBC+Driver+17+for+SQL+Server"
+)
+
+# Define Staging Environment Connection String (PostgreSQL)
+POSTGRES_CONN_STR = (
+    f"postgresql+psycopg://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}"
+    f"@{os.getenv('POSTGRES_HOST', 'localhost')}:{os.getenv('POSTGRES_PORT', '5432')}/{os.getenv('POSTGRES_DB')}"
+)
+
+# Define Destination Connection String (PostgreSQL)
+POSTGRES_DEST_CONN_STR = (
+    f"postgresql+psycopg://{os.getenv('POSTGRES_USER_DEST')}:{os.getenv('POSTGRES_PASSWORD_DEST')}"
+    f"@{os.getenv('POSTGRES_HOST_DEST', 'localhost')}:{os.getenv('POSTGRES_PORT_DEST', '5432')}/{os.getenv('POSTGRES_DB_DEST')}"
+)
+
+# connectorx expects a plain postgresql:// URL
+CX_CONN_STR = POSTGRES_CONN_STR.replace("postgresql+psycopg", "postgresql")
+
+# Number of concurrent COPY streams used to load the destination table
+LOAD_WORKERS = max(1, int(os.getenv("LOAD_WORKERS", "4")))
+
+
+# Create sqlalchemy engines once per process, however many scripts import them
+@lru_cache(maxsize=1)
+def get_sql_server_engine():
+    """Engine for the source DB (SQL Server)."""
+    return create_engine(SQL_SERVER_CONN_STR, echo=False)
+
+
+@lru_cache(maxsize=1)
+def get_staging_engine():
+    """Engine for the staging DB (PostgreSQL)."""
+    return create_engine(POSTGRES_CONN_STR, echo=False)
+
+
+@lru_cache(maxsize=1)
+def get_destination_engine():
+    """Engine for the destination DB (PostgreSQL).
+
+    The pool keeps one connection per COPY stream, so `copy_in_parallel` never waits on a checkout.
+    """
+    return create_engine(POSTGRES_DEST_CONN_STR, echo=False, pool_size=LOAD_WORKERS)
+
+
+# Configure logging once, so importing several scripts does not duplicate the handlers
+@lru_cache(maxsize=1)
+def setup_logging():
+    """Log to `log/data_migration.log` and to the console."""
+    log_dir = os.path.join(os.getcwd(), "log")
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+
+    log_file = os.path.join(log_dir, "data_migration.log")
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        handlers=[
+            logging.FileHandler(log_file, mode="a", encoding="utf-8"),
+            logging.StreamHandler()
+        ]
+    )
@@ -1,78 +1,96 @@
-import pandas as pd
-import os
+import uuid
+import decimal
 import logging
-from sqlalchemy import create_engine, text
+from psycopg import sql
 from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
-from datetime import datetime
-
-# Load environment variables
-load_dotenv()
-
-# Define Source Database Connection Strings
-SQL_SERVER_CONN_STR = (
-    f"mssql+pyodbc://{os.getenv('SQL_SERVER_USER')}:{os.getenv('SQL_SERVER_PASSWORD')}"
-    f"@{os.getenv('SQL_SERVER_HOST')}/{os.getenv('SQL_SERVER_DB')}?driver=ODBC+Driver+17+for+SQL+Server"
-)
-
-# Define Staging Environment Connection Strings
-POSTGRES_CONN_STR = (
-    f"postgresql+psycopg://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}"
-    f"@{os.getenv('POSTGRES_HOST')}/{os.getenv('POSTGRES_DB')}"
-)
-
-# Configure logging
-log_dir = os.path.join(os.getcwd(), "log")
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
-
-log_file = os.path.join(log_dir, "data_migration.log")
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(log_file, mode="a", encoding="utf-8"),
-        logging.StreamHandler()
-    ]
-)
-
-# Create sqlalchemy engines
-sql_server_engine = create_engine(SQL_SERVER_CONN_STR, echo=False)
-postgres_engine = create_engine(POSTGRES_CONN_STR, echo=False)
+from etl_common import setup_logging, get_sql_server_engine, get_staging_engine
+from datetime import datetime, date, time
+
+# Shared sqlalchemy engines and logging
+setup_logging()
+sql_server_engine = get_sql_server_engine()
+postgres_engine = get_staging_engine()
 
 # Create a session for transactions
 Session = sessionmaker(bind=postgres_engine)
 session = Session()
 
+# Postgres column types for the Python types pyodbc reports in cursor.description
+PG_TYPES = {
+    str: "text",
+    int: "bigint",
+    float: "double precision",
+    decimal.Decimal: "double precision",  # Same as before: read_sql coerced Decimal to float64
+    datetime: "timestamp",
+    date: "date",
+    time: "time",
+    bool: "boolean",
+    bytes: "bytea",
+    bytearray: "bytea",
+    uuid.UUID: "uuid",
+}
+
+# Number of source rows fetched per round trip while streaming
+FETCH_SIZE = 10_000
+
+
 # Define Extract Function
-def extract_data():
-    """Fetch data from source DB (SQL Server)."""
+def extract_data(src_cur):
+    """Run the extract query on the source DB (SQL Server) and return its column descriptions."""
     try:
         logging.info("Extracting data from SQL Server...")
 
         query = "SELECT * FROM efz_customers;"
-        df = pd.read_sql(query, sql_server_engine)
-        
-        logging.info(f"Extracted {len(df)} records from SQL Server.")
-        return df
+        src_cur.execute(query)
+
+        return src_cur.description
     
     except Exception as e:
         logging.error(f"Data extraction failed: {e}")
         raise
 
-# Run and display extracted data
-df_extracted = extract_data()
+
+# Recreate the staging table from the source column types
+def create_staging_table(dst_cur, description):
+    """Drop and recreate `stg_customers` with columns matching the source result set."""
+    columns = sql.SQL(", ").join(
+        sql.SQL("{} {}").format(sql.Identifier(col[0]), sql.SQL(PG_TYPES.get(col[1], "text")))
+        for col in description
+    )
+
+    dst_cur.execute("DROP TABLE IF EXISTS stg_customers;")
+    dst_cur.execute(sql.SQL("CREATE TABLE stg_customers ({});").format(columns))
 
 
-# Loading transformed data into the Analytics Database (PostgreSQL)
-def load_to_staging():
-    """Loading ingested data to staging environment (PostgreSQL)."""
+# Loading extracted data into the staging environment (PostgreSQL)
+def load_to_staging(src_cur, dst_conn, description):
+    """Stream the source rows into staging (PostgreSQL) with COPY FROM STDIN, without building a DataFrame."""
     try:
         logging.info("Loading extracted data to PostgreSQL...")
 
-        df_extracted.to_sql("stg_customers", postgres_engine, if_exists="replace", index=False)
+        query = sql.SQL("COPY stg_customers ({}) FROM STDIN").format(
+            sql.SQL(", ").join(sql.Identifier(col[0]) for col in description)
+        )
+        total = 0
+
+        # The table is replaced and reloaded in one transaction, so readers never see it half-loaded
+        with dst_conn.cursor() as dst_cur:
+            create_staging_table(dst_cur, description)
+
+            with dst_cur.copy(query) as copy:
+                while True:
+                    rows = src_cur.fetchmany(FETCH_SIZE)
+                    if not rows:
+                        break
+
+                    for row in rows:
+                        copy.write_row(tuple(row))
+                    total += len(rows)
+
+        dst_conn.commit()
 
         logging.info("Data loaded into PostgreSQL.")
+        return total
 
     except Exception as e:
         logging.error(f"Data loading failed: {e}")
@@ -86,12 +104,16 @@ def main():
         logging.info("Starting data transfer process...")
         start_time = datetime.now()
 
-        # Extract
-        df = extract_data()
-        logging.info(f"Extracted {len(df)} records from Source DB")
+        with sql_server_engine.raw_connection() as src_conn, postgres_engine.raw_connection() as dst_conn:
+            src_cur = src_conn.cursor()
+
+            # Extract
+            description = extract_data(src_cur)
+
+            # Load
+            total = load_to_staging(src_cur, dst_conn, description)
 
-        # Load
-        load_to_staging()
+        logging.info(f"Extracted {total} records from Source DB")
 
         end_time = datetime.now()
         logging.info(f"Data transfer completed successfully in {end_time - start_time}.")
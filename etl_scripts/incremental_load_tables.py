@@ -1,41 +1,14 @@
 import pandas as pd
-import os
 import logging
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
+from etl_common import setup_logging, get_sql_server_engine, get_staging_engine
 from datetime import datetime
 
-# Load environment variables
-load_dotenv()
-
-# Define Source Database Connection Strings
-SQL_SERVER_CONN_STR = (
-    f"mssql+pyodbc://{os.getenv('SQL_SERVER_USER')}:{os.getenv('SQL_SERVER_PASSWORD')}@"
-    f"{os.getenv('SQL_SERVER_HOST')}/{os.getenv('SQL_SERVER_DB')}?driver=ODBC+Driver+17+for+SQL+Server"
-)
-
-# Define Staging Environment Connection Strings
-POSTGRES_CONN_STR = (
-    f"postgresql+psycopg://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@"
-    f"{os.getenv('POSTGRES_HOST')}/{os.getenv('POSTGRES_DB')}"
-)
-
-# Configure logging
-log_dir = os.path.join(os.getcwd(), "log")
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
-
-log_file = os.path.join(log_dir, "data_migration.log")
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler(log_file, mode="a", encoding="utf-8"), logging.StreamHandler()]
-)
-
-# Create sqlalchemy engines
-sql_server_engine = create_engine(SQL_SERVER_CONN_STR, echo=False)
-postgres_engine = create_engine(POSTGRES_CONN_STR, echo=False)
+# Shared sqlalchemy engines and logging
+setup_logging()
+sql_server_engine = get_sql_server_engine()
+postgres_engine = get_staging_engine()
 
 # Create a session for transactions
 Session = sessionmaker(bind=postgres_engine)
@@ -63,14 +36,20 @@ def extract_incremental_data(last_ingested_at):
     try:
         logging.info("Extracting incremental data from SQL Server...")
 
-        # Use last_ingested_at for filtering
-        query = f"""
-            SELECT * 
-            FROM efz_customers
-            WHERE created_at > '{last_ingested_at}';
-        """
-        
-        df = pd.read_sql(query, sql_server_engine)
+        # Bind last_ingested_at as a parameter so SQL Server can reuse the cached plan
+        if last_ingested_at is not None:
+            query = text("""
+                SELECT * 
+                FROM efz_customers
+                WHERE created_at > :last_ingested_at;
+            """)
+            params = {"last_ingested_at": last_ingested_at}
+        else:
+            # No previous ingestion, so load all data
+            query = text("SELECT * FROM efz_customers;")
+            params = None
+
+        df = pd.read_sql(query, sql_server_engine, params=params)
         
         logging.info(f"Extracted {len(df)} records from SQL Server.")
         return df
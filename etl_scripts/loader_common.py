@@ -0,0 +1,198 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from concurrent.futures import ThreadPoolExecutor
+from psycopg import sql
+from pandas.api.types import infer_dtype, is_string_dtype
+from etl_common import CX_CONN_STR, LOAD_WORKERS, get_staging_engine, get_destination_engine
+
+try:
+    import connectorx as cx
+except ImportError:  # Fall back to pd.read_sql for the staging extract
+    cx = None
+
+
+# Extract data from staging DB
+def extract_staging_data():
+    """Fetch data from staging DB."""
+    tables = ["stg_customers", "customer_uuids"]
+    dataframes = {}
+
+    with get_staging_engine().connect() as conn:
+        for table in tables:
+            # Stream the staging table through connectorx (Arrow buffers) when it is available;
+            # customer_uuids is small, so read_sql is good enough for it
+            if cx is not None and table == "stg_customers":
+                df = cx.read_sql(CX_CONN_STR, f"SELECT * FROM {table}", return_type="pandas")
+            else:
+                query = f"SELECT * FROM {table};"
+                df = pd.read_sql(query, conn)
+            dataframes[table] = df
+    
+    return dataframes
+
+
+# Read a mapping sheet without going through pandas
+def read_mapping_sheet(wb, sheet_name):
+    """Return a worksheet of the mapping document as a {header: [values]} dict."""
+    rows = wb[sheet_name].values
+    headers = next(rows)
+    columns = {header: [] for header in headers}
+
+    for row in rows:
+        for header, value in zip(headers, row):
+            columns[header].append(value)
+
+    return columns
+
+
+def select_mapped_columns(df, columns, defaults):
+    """Return `df` restricted to `columns`, adding missing ones with their default values.
+
+    All missing columns are added in a single `assign` instead of one insert per column.
+    """
+    columns = list(columns)
+    missing = {col: defaults.get(col, "") for col in columns if col not in df.columns}
+
+    return df.assign(**missing)[columns]
+
+
+# Columns holding the pre-generated UUIDs
+UUID_COLUMNS = ("customerId", "customerProfileId")
+
+
+def to_arrow_strings(df):
+    """Store the all-string object columns and the UUID columns of `df` as `string[pyarrow]`.
+
+    Other object columns (bool, Decimal, date or dict values) keep their Python objects.
+    """
+    # Only real object columns; columns already in pandas' Arrow-backed `str` dtype keep their NaN marker
+    columns = [
+        col for col, dtype in df.dtypes.items()
+        if dtype == object and (col in UUID_COLUMNS or infer_dtype(df[col], skipna=True) == "string")
+    ]
+
+    return df.astype({col: "string[pyarrow]" for col in columns})
+
+
+def to_datetime_column(col):
+    """Convert a string column to datetime64 with Arrow's ISO-8601 cast kernel.
+
+    Falls back to `pd.to_datetime(errors='coerce')` for non-string columns and for values
+    Arrow cannot parse (other formats, time zone offsets).
+    """
+    if not is_string_dtype(col):
+        return pd.to_datetime(col, errors='coerce')
+
+    try:
+        arr = pc.cast(pa.array(col, from_pandas=True), pa.timestamp('us'))
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return pd.to_datetime(col, errors='coerce')
+
+    return pd.Series(arr.to_numpy(zero_copy_only=False), index=col.index, name=col.name)
+
+
+# Stream a DataFrame into PostgreSQL using COPY
+def copy_dataframe(raw_conn, table, df):
+    """Write `df` into `table` with COPY FROM STDIN on a raw psycopg connection."""
+    query = sql.SQL("COPY {} ({}) FROM STDIN").format(
+        sql.Identifier(table),
+        sql.SQL(", ").join(sql.Identifier(col) for col in df.columns)
+    )
+
+    # COPY only writes NULL for None, so replace NaN/NaT before streaming the rows
+    rows = df.astype(object).where(df.notna(), None)
+
+    with raw_conn.cursor() as cur:
+        with cur.copy(query) as copy:
+            for row in rows.itertuples(index=False, name=None):
+                copy.write_row(row)
+
+
+# Load a DataFrame over several destination connections at once
+def copy_in_parallel(table, df):
+    """Split `df` into contiguous chunks and COPY them concurrently, one connection per chunk.
+
+    Each chunk commits on its own, so callers load into a stage table and publish it
+    afterwards rather than copying straight into the destination table.
+    """
+    workers = max(1, min(LOAD_WORKERS, len(df)))
+    chunk_size = max(1, -(-len(df) // workers))  # ceiling division
+    chunks = [df.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size)]
+
+    def copy_chunk(chunk):
+        with get_destination_engine().raw_connection() as raw_conn:
+            copy_dataframe(raw_conn, table, chunk)
+            raw_conn.commit()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(copy_chunk, chunks))  # list() surfaces exceptions raised in the workers
+
+
+# Destination table columns, looked up once per table
+_VALID_COLS = {}
+
+
+def prepare_destination(table):
+    """Fetch the valid columns of `table` and recreate its UNLOGGED stage table in one pipelined round trip.
+
+    The column lookup is cached, so later runs in the same process skip it.
+    """
+    stage = sql.Identifier(f"{table}_stage")
+
+    with get_destination_engine().raw_connection() as raw_conn:
+        conn = raw_conn.driver_connection
+
+        # Pipeline mode sends the statements back-to-back and reads the results at the end
+        with conn.pipeline():
+            cur = conn.cursor()
+            if table not in _VALID_COLS:
+                cur.execute(
+                    """
+                    SELECT column_name 
+                    FROM information_schema.columns 
+                    WHERE table_name = %(table)s
+                    """,
+                    {"table": table}
+                )
+
+            # Recreate the stage table so it always matches the current destination schema;
+            # it skips WAL and only holds the rows of the current run
+            conn.execute(sql.SQL("DROP TABLE IF EXISTS {};").format(stage))
+            conn.execute(
+                sql.SQL("CREATE UNLOGGED TABLE {} (LIKE {} INCLUDING DEFAULTS);").format(stage, sql.Identifier(table))
+            )
+
+        if table not in _VALID_COLS:
+            _VALID_COLS[table] = [col[0] for col in cur.fetchall()]  # List of valid columns in destination table
+
+        conn.commit()
+
+    return _VALID_COLS[table]
+
+
+def publish_stage(table, columns):
+    """Replace the contents of `table` with its stage table in a single transaction.
+
+    `synchronous_commit` is switched off for this transaction only: a server crash right
+    after the commit can lose it (without corrupting data), and the UNLOGGED stage table
+    is emptied by crash recovery. Both are acceptable because the load is re-runnable.
+    """
+    target = sql.Identifier(table)
+    stage = sql.Identifier(f"{table}_stage")
+    column_list = sql.SQL(", ").join(sql.Identifier(col) for col in columns)
+
+    with get_destination_engine().raw_connection() as raw_conn:
+        conn = raw_conn.driver_connection
+
+        with conn.pipeline():
+            conn.execute("SET LOCAL synchronous_commit = off;")
+
+            # Delete existing records so the new load does not violate unique constraints
+            conn.execute(sql.SQL("TRUNCATE TABLE {};").format(target))
+            conn.execute(
+                sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {};").format(target, column_list, column_list, stage)
+            )
+            conn.execute(sql.SQL("TRUNCATE TABLE {};").format(stage))
+
+        conn.commit()
@@ -0,0 +1,8 @@
+-- one-off: index the incremental load watermark column on the source (SQL Server)
+if not exists (
+    select 1
+    from sys.indexes
+    where name = 'ix_efz_customers_created_at'
+      and object_id = object_id('efz_customers')
+)
+create index ix_efz_customers_created_at on efz_customers (created_at);